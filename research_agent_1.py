@@ -1,41 +1,118 @@
 import os
-from openai import OpenAI
-from bs4 import BeautifulSoup
+from openai import AsyncOpenAI
+from selectolax.parser import HTMLParser
+import httpx
 from playwright.async_api import async_playwright
 from dotenv import load_dotenv
 import asyncio
 from duckduckgo_search import DDGS
+from duckduckgo_search.exceptions import RatelimitException
 import json
+from collections import defaultdict, deque
+import re
 from datetime import datetime
 import time
+import random
+import threading
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from hashlib import sha256
+import diskcache
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 load_dotenv()
 import logging
 
 logger = logging.getLogger(__name__)
+
+# Static prompt prefixes. They are sent as the system message and kept byte-identical
+# across calls so provider-side prompt caching can reuse them; only the user message varies.
+EXTRACT_SYSTEM = """You are a highly intelligent search query generator mainly focused on research for a given topic. Your task is to extract
+the most important keywords from the user's request and then generate a list of
+diverse and effective search queries (combinations of 1 to 5 words) that
+a search engine can use to find highly relevant information.
+
+Focus on variations that capture different facets of the original query.
+Ensure each generated query is concise and directly searchable.
+Return 3 to 5 queries as a comma-separated list. Do not include any other text or formatting.
+
+Example:
+Original Query: "What are the latest breakthroughs in renewable energy technology?"
+Output: renewable energy breakthroughs, latest renewable energy, renewable energy technology, green energy innovations, sustainable tech advancements
+
+Original Query: "Best practices for agile software development teams"
+Output: agile software development, agile team practices, scrum best practices, lean software development, agile methodologies
+
+Original Query: "How to train a dog to sit and stay?"
+Output: train dog sit, dog training stay, teaching dog commands, basic dog obedience, puppy sit stay"""
+
+RELEVANCE_SYSTEM = """You decide whether an article is relevant to a research query.
+The user message contains the query followed by the article content.
+Respond only with 'Yes' or 'No' with no explanation."""
+
+RELEVANCE_BATCH_SYSTEM = """You decide whether documents are relevant to a research query.
+The user message contains the query followed by numbered documents ("Doc 1: ...").
+Respond only with a JSON object mapping each document number to "yes" or "no",
+for example {"1": "yes", "2": "no"}. Do not include any other text."""
+
 class AsyncRateLimiter:
     def __init__(self, max_calls, period_seconds):
         self.max_calls = max_calls
         self.period = period_seconds
         self.lock = asyncio.Lock()
-        self.calls = []
+        # Call timestamps, oldest first
+        self.calls = deque()
+
+    def _evict_expired(self, now):
+        while self.calls and now - self.calls[0] >= self.period:
+            self.calls.popleft()
 
     async def acquire(self):
         async with self.lock:
             now = time.monotonic()
-            self.calls = [t for t in self.calls if now - t < self.period]
+            self._evict_expired(now)
             
             if len(self.calls) >= self.max_calls:
-                sleep_time = self.period - (now - self.calls[0]) + 1  # Add 1 second buffer
+                sleep_time = max(0, self.period - (now - self.calls[0]))
                 logger.info(f"Rate limit reached, waiting {sleep_time:.1f} seconds...")
                 await asyncio.sleep(sleep_time)
                 now = time.monotonic()
-                self.calls = [t for t in self.calls if now - t < self.period]
+                self._evict_expired(now)
             
-            self.calls.append(time.monotonic())
+            self.calls.append(now)
+
+class DiskLLMCache:
+    """On-disk cache of LLM responses keyed by a hash of the request"""
+
+    def __init__(self, directory="./.llm_cache", expire_seconds=86400):
+        self.cache = diskcache.Cache(directory)
+        self.expire = expire_seconds
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model, messages):
+        payload = json.dumps({"m": model, "msgs": messages}, sort_keys=True)
+        return sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.cache.set(key, value, expire=self.expire)
+
+    def close(self):
+        self.cache.close()
 
 class LLMClient:
     def __init__(self):
-        self.client = OpenAI(
+        self.client = AsyncOpenAI(
             api_key=os.getenv('OPENROUTER_API_KEY'),
             base_url="https://openrouter.ai/api/v1"
         )
@@ -45,6 +122,11 @@ class LLMClient:
         # Context storage
         self.conversation_history = []
         self.max_context_length = 30  # Maximum number of messages to keep in context
+        # Identical (model, messages) requests are answered from disk
+        self.cache = DiskLLMCache()
+        # Background event loop for chat_sync, created lazily
+        self._sync_loop = None
+        self._sync_loop_lock = threading.Lock()
     
     def add_to_context(self, role, content):
         """Add a message to the conversation context"""
@@ -69,32 +151,50 @@ class LLMClient:
         # Add new system message at the beginning
         self.conversation_history.insert(0, {"role": "system", "content": system_message})
     
-    async def chat(self, prompt, use_context=True, add_to_history=True):
+    async def chat(self, prompt, use_context=True, add_to_history=True, system_prompt=None):
         """
-        Send a chat message with rate limiting and optional context
+        Send a chat message with rate limiting, response caching and optional context
         
         Args:
             prompt: The user's message
             use_context: Whether to include conversation history in the request
             add_to_history: Whether to add this interaction to the conversation history
+            system_prompt: Static instructions sent first so providers can cache the prefix
         """
-        # Apply rate limiting
-        await self.rate_limiter.acquire()
-        
         # Prepare messages
+        messages = []
+        if system_prompt:
+            messages.append({
+                "role": "system",
+                "content": [{
+                    "type": "text",
+                    "text": system_prompt,
+                    "cache_control": {"type": "ephemeral"}
+                }]
+            })
         if use_context and self.conversation_history:
-            messages = self.conversation_history.copy()
-            messages.append({"role": "user", "content": prompt})
-        else:
-            messages = [{"role": "user", "content": prompt}]
+            messages.extend(self.conversation_history)
+        messages.append({"role": "user", "content": prompt})
         
+        cache_key = self.cache.make_key(self.model, messages)
+        assistant_response = self.cache.get(cache_key)
+        if assistant_response is not None:
+            if add_to_history:
+                self.add_to_context("user", prompt)
+                self.add_to_context("assistant", assistant_response)
+            return assistant_response
+
+        # Apply rate limiting
+        await self.rate_limiter.acquire()
+
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=messages
             )
             
             assistant_response = response.choices[0].message.content.strip()
+            self.cache.set(cache_key, assistant_response)
             
             # Add to conversation history if requested
             if add_to_history:
@@ -107,74 +207,299 @@ class LLMClient:
             logger.error(f"Error in chat request: {e}")
             raise
     
+    def _ensure_sync_loop(self):
+        """Start the background event loop used by chat_sync on first use"""
+        with self._sync_loop_lock:
+            if self._sync_loop is None:
+                self._sync_loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._sync_loop.run_forever, daemon=True)
+                thread.start()
+        return self._sync_loop
+
     def chat_sync(self, prompt, use_context=True, add_to_history=True):
         """
-        Synchronous wrapper for the async chat method
+        Synchronous wrapper for the async chat method, for REPL use only.
+        Calls run on one persistent background loop instead of a new loop per call,
+        so the client and rate limiter keep their state between calls. The codebase
+        is async-first; prefer awaiting chat() and do not mix the two on one client.
         """
-        return asyncio.run(self.chat(prompt, use_context, add_to_history))
+        loop = self._ensure_sync_loop()
+        future = asyncio.run_coroutine_threadsafe(
+            self.chat(prompt, use_context, add_to_history), loop
+        )
+        return future.result()
 
 class WebScraper: 
-    def __init__(self):
-        self.url = ""
-        self.title = ''
-        self.content = ''
+    # Resource types that are never needed for text extraction
+    BLOCKED_RESOURCE_TYPES = {"image", "font", "media", "stylesheet"}
+    # Analytics/ad hosts whose requests are aborted before hitting the network
+    BLOCKED_HOSTS = (
+        "google-analytics.com", "googletagmanager.com", "doubleclick.net",
+        "facebook.net", "hotjar.com", "scorecardresearch.com", "adservice.google.com"
+    )
+
+    # Many sites reject the default python-httpx User-Agent outright
+    USER_AGENT = (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+    )
+    # Pages with less extracted text than this are re-fetched with the browser
+    MIN_STATIC_CONTENT_LENGTH = 500
+    # Only the start of each page is ever used downstream
+    MAX_CONTENT_LENGTH = 8000
+    # Returns the title and the first maxLength characters of the rendered body text
+    EXTRACT_TEXT_JS = """(maxLength) => ({
+        title: document.title || '',
+        text: (document.body && document.body.innerText) ? document.body.innerText.slice(0, maxLength) : ''
+    })"""
+
+    def __init__(self, max_concurrent_scrapes=8):
+        # Playwright and the browser are launched once and shared by every scrape
+        self._pw = None
+        self._browser = None
+        # Plain HTTP client for pages that render without JavaScript
+        self._http = None
+        # At most two scrapes per domain at a time, sharing one warm browser context
+        self.max_scrapes_per_domain = 2
+        self._domain_sems = defaultdict(lambda: asyncio.Semaphore(self.max_scrapes_per_domain))
+        self._domain_ctx = {}
+        # Overall cap on pages scraped at the same time, taken after the domain slot
+        self._scrape_sem = asyncio.Semaphore(max_concurrent_scrapes)
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.aclose()
+
+    async def start(self):
+        """Launch Playwright, the shared browser and the HTTP client if not already running"""
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                http2=True, follow_redirects=True, timeout=15,
+                headers={"User-Agent": self.USER_AGENT}
+            )
+        if self._browser is None:
+            self._pw = await async_playwright().start()
+            self._browser = await self._pw.chromium.launch(headless=True)
+
+    async def aclose(self):
+        """Close the HTTP client, the per-domain contexts and the shared browser, then stop Playwright"""
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        for ctx_future in self._domain_ctx.values():
+            try:
+                ctx = await ctx_future
+                await ctx.close()
+            except Exception as e:
+                logger.error(f"Error closing browser context: {e}")
+        self._domain_ctx.clear()
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._pw is not None:
+            await self._pw.stop()
+            self._pw = None
+
+    async def _route_request(self, route):
+        """Abort heavy assets and trackers, let everything else through"""
+        request = route.request
+        host = urlsplit(request.url).netloc
+        if (request.resource_type in self.BLOCKED_RESOURCE_TYPES
+                or any(host == h or host.endswith("." + h) for h in self.BLOCKED_HOSTS)):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _parse_html(self, html_content):
+        """Return (title, text) extracted from an HTML document"""
+        tree = HTMLParser(html_content)
+        title_node = tree.css_first('title')
+        title = title_node.text(strip=True) if title_node else ''
+        content = ''
+        if tree.body:
+            for irrelevant in tree.body.css('script, img, style, input, nav, footer, header, aside'):
+                irrelevant.decompose()
+            text = tree.body.text(separator='\n', strip=True)
+            # Drop the empty lines left behind by whitespace-only text nodes
+            content = '\n'.join(line for line in text.splitlines() if line)[:self.MAX_CONTENT_LENGTH]
+        return title, content
+
+    async def _scrape_static(self, url):
+        """Fetch the page over plain HTTP; returns None when the browser is needed"""
+        try:
+            # Stream so the headers can be checked before any body is downloaded
+            async with self._http.stream("GET", url) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("content-type", "").lower()
+                # Only a declared non-HTML type is skipped; a missing header is parsed as HTML
+                if content_type and "html" not in content_type:
+                    # PDFs and other binaries have no DOM text for the browser to find either
+                    logger.info(f"Skipping non-HTML response from {url}")
+                    return {"content" : "", "title" : ""}
+                await response.aread()
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            logger.info(f"Static fetch failed for {url}, falling back to browser: {e}")
+            return None
+
+        title, content = self._parse_html(response.text)
+        # Tiny or untitled pages are usually SPA shells that need JavaScript
+        if not title or len(content) < self.MIN_STATIC_CONTENT_LENGTH:
+            return None
+        return {"content" : content, "title" : title}
+
+    async def _new_context(self):
+        ctx = await self._browser.new_context()
+        await ctx.route("**/*", self._route_request)
+        return ctx
+
+    async def _context_for(self, host):
+        """Return the browser context shared by every page of a domain"""
+        if host not in self._domain_ctx:
+            # Store the pending creation so concurrent callers share one context
+            self._domain_ctx[host] = asyncio.ensure_future(self._new_context())
+        try:
+            return await self._domain_ctx[host]
+        except Exception:
+            # Let the next scrape of this domain retry instead of reusing the failure
+            self._domain_ctx.pop(host, None)
+            raise
 
-    async def scrape_website(self, url):
-        self.url = url
-        async with async_playwright() as p:
-            browser = await p.chromium.launch()
-            page = await browser.new_page()
+    async def _scrape_with_browser(self, url, host):
+        title = ''
+        content = ''
+        ctx = await self._context_for(host)
+        page = await ctx.new_page()
 
-            try:
-                await page.goto(self.url, timeout=60000, wait_until='domcontentloaded')
-                html_content = await page.content()
-                soup = BeautifulSoup(html_content, 'html.parser')
-                self.title = await page.title()
-
-                if soup.body:
-                    for irrelevant in soup.body(['script', 'img', 'style', 'input', 'nav', 'footer', 'header', 'aside']):
-                        irrelevant.decompose()
-                    self.content = soup.body.get_text(separator='\n',strip = True)
-                else:
-                    self.content = ''
+        try:
+            await page.goto(url, timeout=60000, wait_until='domcontentloaded')
+            # Extract rendered text in the page itself instead of shipping the full HTML back
+            extracted = await page.evaluate(self.EXTRACT_TEXT_JS, self.MAX_CONTENT_LENGTH)
+            title = extracted["title"].strip()
+            content = extracted["text"].strip()
 
-            except Exception as e:
-                print(f"Error scraping {self.url}: {e}")
-                self.title = f"Scraping Error: {type(e).__name__}"
-                self.webContent = ""
+        except Exception as e:
+            print(f"Error scraping {url}: {e}")
+            title = f"Scraping Error: {type(e).__name__}"
+            content = ""
 
-            finally:
-                await browser.close()
-            return {"content" : self.content, "title" : self.title}
+        finally:
+            await page.close()
+        return {"content" : content, "title" : title}
+
+    async def scrape_website(self, url):
+        # Scrapes run concurrently, so results are returned rather than stored on self
+        await self.start()
+        host = urlsplit(url).netloc.lower()
+        # Wait for the domain first so queued same-host scrapes never hold global slots
+        async with self._domain_sems[host], self._scrape_sem:
+            result = await self._scrape_static(url)
+            if result is None:
+                result = await self._scrape_with_browser(url, host)
+        return result
 
 class Search:
 
     def __init__(self):
         self.MAX_TOTAL_UNIQUE_RESULTS = 50
+        # Queries sent to DuckDuckGo at the same time
+        self.max_concurrent_queries = 3
+        self.max_retries = 3
+        # Results per normalized query are reused across runs for 6 hours
+        self.cache = diskcache.Cache("./.ddg_cache")
+        self.cache_expire_seconds = 21600
+
+    # Query parameters that only track the click and never change the page
+    TRACKING_PARAM_PREFIXES = ("utm_", "fbclid", "gclid", "msclkid")
+
+    @classmethod
+    def canonical_url(cls, url):
+        """Normalize a URL so trivially different links to the same page compare equal"""
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower()
+        try:
+            port = parts.port
+        except ValueError:
+            port = None
+        # Keep the port only when it is not the scheme's default
+        if port and (scheme, port) not in (("http", 80), ("https", 443)):
+            host = f"{host}:{port}"
+        # http and https almost always serve the same content
+        if scheme == "http":
+            scheme = "https"
+        query = urlencode([
+            (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+            if not k.lower().startswith(cls.TRACKING_PARAM_PREFIXES)
+        ])
+        return urlunsplit((scheme, host, parts.path.rstrip("/") or "/", query, ""))
+
+    def close(self):
+        """Close the on-disk search result cache"""
+        self.cache.close()
+
+    @staticmethod
+    def _cache_key(query, max_results):
+        normalized = " ".join(query.lower().split())
+        return f"{sha256(normalized.encode()).hexdigest()}:{max_results}"
+
+    def _one_query(self, query, max_results):
+        """Blocking DuckDuckGo text search for a single query, served from cache when possible"""
+        key = self._cache_key(query, max_results)
+        cached = self.cache.get(key)
+        if cached:
+            return cached
 
-    def search(self, list_of_queries, max_results=10):
-        unique_results = {}
         with DDGS() as ddgs:
-            for query in list_of_queries:
-                if len(unique_results) >= self.MAX_TOTAL_UNIQUE_RESULTS:
-                    break
+            results = list(ddgs.text(query, max_results=max_results))
+        if results:
+            self.cache.set(key, results, expire=self.cache_expire_seconds)
+        else:
+            # Never keep an empty answer around; it is usually a transient failure
+            self.cache.delete(key)
+        return results
+
+    async def _search_query(self, query, max_results, semaphore):
+        async with semaphore:
+            for attempt in range(self.max_retries):
                 try:
-                    with DDGS() as ddgs:
-                        results_for_current_query = ddgs.text(query, max_results=max_results)
-                    for result_item in results_for_current_query:
-                        href = result_item.get("href")
-
-                        if href and href not in unique_results:
-                            unique_results[href] = {"href": href}
-                            
-                            if len(unique_results) >= self.MAX_TOTAL_UNIQUE_RESULTS:
-                                break
+                    return await asyncio.to_thread(self._one_query, query, max_results)
+                except RatelimitException:
+                    # Jittered backoff, only when DuckDuckGo actually rate limits us
+                    await asyncio.sleep(random.uniform(0.2, 0.6) * 2 ** attempt)
                 except Exception as e:
                     print(f"Error searching for '{query}': {e}")
-                time.sleep(1)
-            final_unique_list = list(unique_results.values())
-            print(f"Finished. Total unique results collected: {len(final_unique_list)}")
-            return final_unique_list[:self.MAX_TOTAL_UNIQUE_RESULTS]
+                    return []
+            print(f"Error searching for '{query}': rate limited after {self.max_retries} attempts")
+            return []
+
+    async def search_stream(self, list_of_queries, max_results=10):
+        """Yield unique results as soon as each query finishes, instead of after all of them"""
+        semaphore = asyncio.Semaphore(self.max_concurrent_queries)
+        pending = [self._search_query(query, max_results, semaphore) for query in list_of_queries]
+
+        unique_results = set()
+        for next_query in asyncio.as_completed(pending):
+            results_for_current_query = await next_query
+            for result_item in results_for_current_query:
+                if len(unique_results) >= self.MAX_TOTAL_UNIQUE_RESULTS:
+                    break
+                href = result_item.get("href")
+                if not href:
+                    continue
+
+                # Deduplicate on the canonical form but keep the original link for output
+                key = self.canonical_url(href)
+                if key not in unique_results:
+                    unique_results.add(key)
+                    yield {"href": href}
+
+        print(f"Finished. Total unique results collected: {len(unique_results)}")
+
+    async def search(self, list_of_queries, max_results=10):
+        return [result async for result in self.search_stream(list_of_queries, max_results)]
 
 class SearchQueryGenerator:
 
@@ -183,54 +508,284 @@ class SearchQueryGenerator:
         self.search_queries = []
     
     async def extract(self, query):
-        prompt = f"""
-        You are a highly intelligent search query generator mainly focused on research for a given topic. Your task is to extract
-        the most important keywords from the user's request and then generate a list of
-        diverse and effective search queries (combinations of 1 to 5 words) that
-        a search engine can use to find highly relevant information.
-
-        Focus on variations that capture different facets of the original query.
-        Ensure each generated query is concise and directly searchable.
-        Return 3 to 5 queries as a comma-separated list. Do not include any other text or formatting.
-
-        Example:
-        Original Query: "What are the latest breakthroughs in renewable energy technology?"
-        Output: renewable energy breakthroughs, latest renewable energy, renewable energy technology, green energy innovations, sustainable tech advancements
-
-        Original Query: "Best practices for agile software development teams"
-        Output: agile software development, agile team practices, scrum best practices, lean software development, agile methodologies
-
-        Original Query: "How to train a dog to sit and stay?"
-        Output: train dog sit, dog training stay, teaching dog commands, basic dog obedience, puppy sit stay
-
-        Original Query: "{query}"
-        Output:
-        """
-        result = self.llm.chat(prompt)
+        prompt = f"""Original Query: "{query}"
+Output:"""
+        result = await self.llm.chat(
+            prompt, use_context=False, add_to_history=False, system_prompt=EXTRACT_SYSTEM
+        )
         
         keywords_line = result.strip().splitlines()[-1]
         self.search_queries = [word.strip() for word in keywords_line.split(",") if word.strip()]
         print(self.search_queries)
         return self.search_queries
 
+class SemanticRelevanceCache:
+    """
+    Reuses relevance verdicts for near-duplicate pages of the same query.
+    The cache is only an optimisation: if the embedding model cannot be loaded
+    it disables itself and every page goes to the LLM.
+    """
+
+    def __init__(self, model_name="all-MiniLM-L6-v2", threshold=0.92):
+        self.model_name = model_name
+        self.threshold = threshold
+        self._model = None
+        self._faiss = None
+        self._model_lock = threading.Lock()
+        self.disabled = False
+        # Per-query inner-product index over normalized embeddings, plus the verdict of each row
+        self._indexes = {}
+        self._verdicts = {}
+
+    def _embed_blocking(self, texts):
+        with self._model_lock:
+            if self._model is None and not self.disabled:
+                try:
+                    # Imported here so torch is only loaded, and only required, when the cache is used
+                    import faiss
+                    from sentence_transformers import SentenceTransformer
+                    self._faiss = faiss
+                    self._model = SentenceTransformer(self.model_name)
+                except Exception as e:
+                    logger.warning(f"Semantic cache disabled, could not load {self.model_name}: {e}")
+                    self.disabled = True
+        if self.disabled:
+            return None
+        try:
+            return self._model.encode(texts, batch_size=32, normalize_embeddings=True)
+        except Exception as e:
+            logger.warning(f"Semantic cache disabled, encoding failed: {e}")
+            self.disabled = True
+            return None
+
+    async def embed(self, texts):
+        """Embed a list of texts as L2-normalized float32 rows, or None when the cache is disabled"""
+        if self.disabled:
+            return None
+        # Loading the model and encoding are CPU-bound, so keep them off the event loop
+        return await asyncio.to_thread(self._embed_blocking, texts)
+
+    def is_similar(self, vector, other):
+        """Whether two normalized embeddings are near-duplicates"""
+        if vector is None or other is None:
+            return False
+        return float((vector @ other.T)[0][0]) > self.threshold
+
+    def lookup(self, query, vector):
+        """Return the cached verdict for a similar page, or None"""
+        if vector is None:
+            return None
+        index = self._indexes.get(query)
+        if index is None or index.ntotal == 0:
+            return None
+        similarities, ids = index.search(vector, 1)
+        if similarities[0][0] > self.threshold:
+            return self._verdicts[query][ids[0][0]]
+        return None
+
+    def add(self, query, vector, verdict):
+        if vector is None:
+            return
+        if query not in self._indexes:
+            self._indexes[query] = self._faiss.IndexFlatIP(vector.shape[1])
+            self._verdicts[query] = []
+        self._indexes[query].add(vector)
+        self._verdicts[query].append(verdict)
+
 class RelevanceChecker:
+    # Token budget of the article text sent per page, alone and in a batch
+    MAX_SNIPPET_TOKENS = 600
+    MAX_BATCH_SNIPPET_TOKENS = 250
+
     def __init__(self, llm):
         self.llm = llm
-
-    def is_relevant(self, query, content):
-        prompt = f"""Is the following article relevant to the query: "{query}"?
-Respond only with 'Yes' or 'No' with no explanation.
+        self.semantic_cache = SemanticRelevanceCache()
+        # Loaded on first use; stays None (~4 characters per token) if tiktoken is unusable
+        self._encoding = None
+        self._encoding_loaded = False
+        self._encoding_lock = threading.Lock()
+
+    @staticmethod
+    def _clean(text):
+        """Collapse all whitespace runs so the token budget is spent on words"""
+        return re.sub(r"\s+", " ", text).strip()
+
+    def _get_encoding(self):
+        with self._encoding_lock:
+            if not self._encoding_loaded:
+                if tiktoken is not None:
+                    try:
+                        # Downloads the BPE file on first use, which fails offline
+                        self._encoding = tiktoken.get_encoding("cl100k_base")
+                    except Exception as e:
+                        logger.warning(f"Could not load tiktoken encoding, estimating tokens instead: {e}")
+                self._encoding_loaded = True
+        return self._encoding
+
+    async def load_encoding(self):
+        """Load the tokenizer off the event loop, since the first load is a blocking download"""
+        if not self._encoding_loaded:
+            await asyncio.to_thread(self._get_encoding)
+
+    def _truncate_tokens(self, text, max_tokens):
+        if self._get_encoding() is None:
+            return text[:max_tokens * 4]
+        ids = self._encoding.encode(text)
+        if len(ids) <= max_tokens:
+            return text
+        return self._encoding.decode(ids[:max_tokens])
+
+    def _snippet(self, content):
+        return self._truncate_tokens(self._clean(content), self.MAX_SNIPPET_TOKENS)
+
+    async def is_relevant(self, query, content):
+        await self.load_encoding()
+        snippet = self._snippet(content)
+        vector = await self.semantic_cache.embed([snippet])
+        cached = self.semantic_cache.lookup(query, vector)
+        if cached is not None:
+            return cached
+
+        prompt = f"""Query: "{query}"
 
 --- Article Content ---
-{content[:2000]}"""  
+{snippet}"""  
 
-        answer = self.llm.chat(prompt)
-        return "yes" in answer.lower()
+        answer = await self.llm.chat(
+            prompt, use_context=False, add_to_history=False, system_prompt=RELEVANCE_SYSTEM
+        )
+        relevant = "yes" in answer.lower()
+        self.semantic_cache.add(query, vector, relevant)
+        return relevant
+
+    @staticmethod
+    def _parse_verdict(value):
+        """Map a per-document answer from the batch reply to True/False, or None if unclear"""
+        if isinstance(value, bool):
+            return value
+        answer = str(value).strip().lower() if value is not None else ""
+        if answer in ("yes", "true"):
+            return True
+        if answer in ("no", "false"):
+            return False
+        return None
+
+    async def is_relevant_batch(self, query, items):
+        """
+        Classify several articles with a single LLM call
+
+        Args:
+            query: The research query
+            items: List of (id, content) pairs
+
+        Returns a dict mapping each id to True/False
+        """
+        verdicts = {}
+        pending = []
+        # Near-duplicates within this batch reuse the verdict of the first such page
+        duplicate_of = {}
+        # Each page is cleaned and truncated once, then shared by the cache and the prompt
+        await self.load_encoding()
+        snippets = [self._snippet(content) for _, content in items]
+        vectors = await self.semantic_cache.embed(snippets)
+        if vectors is None:
+            vectors = [None] * len(snippets)
+        for (doc_id, _), snippet, vector in zip(items, snippets, vectors):
+            if vector is not None:
+                vector = vector.reshape(1, -1)
+            cached = self.semantic_cache.lookup(query, vector)
+            if cached is not None:
+                verdicts[doc_id] = cached
+                continue
+            original = next(
+                (other_id for other_id, _, other in pending if self.semantic_cache.is_similar(vector, other)),
+                None
+            )
+            if original is None:
+                pending.append((doc_id, snippet, vector))
+            else:
+                duplicate_of[doc_id] = original
+        if not pending:
+            return verdicts
+
+        documents = "\n\n".join(
+            f"Doc {doc_id}: {self._truncate_tokens(snippet, self.MAX_BATCH_SNIPPET_TOKENS)}"
+            for doc_id, snippet, _ in pending
+        )
+        prompt = f"""Query: "{query}"
+
+{documents}"""
+
+        answer = await self.llm.chat(
+            prompt, use_context=False, add_to_history=False, system_prompt=RELEVANCE_BATCH_SYSTEM
+        )
+        try:
+            # Models sometimes wrap the object in prose or a code fence
+            match = re.search(r"\{.*\}", answer, re.DOTALL)
+            parsed = json.loads(match.group(0)) if match else {}
+        except json.JSONDecodeError as e:
+            logger.error(f"Could not parse relevance batch response: {e}")
+            parsed = {}
+
+        if not isinstance(parsed, dict):
+            parsed = {}
+
+        for doc_id, snippet, vector in pending:
+            relevant = self._parse_verdict(parsed.get(doc_id))
+            if relevant is None:
+                # The batch reply skipped or garbled this document, so ask about it on its own
+                verdicts[doc_id] = await self.is_relevant(query, snippet)
+                continue
+            self.semantic_cache.add(query, vector, relevant)
+            verdicts[doc_id] = relevant
+        for doc_id, original in duplicate_of.items():
+            verdicts[doc_id] = verdicts[original]
+        return verdicts
     
 
-class JSONFormatter:
-    def format(self, resources):
-        return json.dumps(resources, indent=2)
+class KeywordPrefilter:
+    """Cheap local relevance verdict from the generated search queries"""
+
+    def __init__(self, keywords, min_matches=2):
+        self.min_matches = min_matches
+        self.phrases = {k.lower() for k in keywords if k.strip()}
+        # Very short words match nearly any page, so they never count as overlap
+        self.words = {w for phrase in self.phrases for w in re.findall(r"\w+", phrase) if len(w) > 2}
+
+    def verdict(self, text):
+        """Return True/False when the keywords decide it, or None when the LLM should"""
+        lowered = text[:2000].lower()
+        if sum(1 for phrase in self.phrases if phrase in lowered) >= self.min_matches:
+            return True
+        # Without any usable words (e.g. only "AI", "ML") there is nothing to reject on
+        if self.words and not any(word in lowered for word in self.words):
+            return False
+        return None
+
+class JSONStreamWriter:
+    """Writes a JSON array to disk one item at a time so partial results survive a crash"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def __enter__(self):
+        self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write("[")
+        self._file.flush()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.write("\n]\n" if self.count else "]\n")
+        self._file.close()
+        self._file = None
+
+    def write(self, item):
+        separator = ",\n" if self.count else "\n"
+        self._file.write(separator + json.dumps(item, indent=2))
+        self._file.flush()
+        self.count += 1
     
 
 class ResearchAgent:
@@ -238,42 +793,99 @@ class ResearchAgent:
         self.llm = LLMClient()
         self.extractor = SearchQueryGenerator(self.llm)
         self.search = Search()
-        self.scraper = WebScraper()
+        # At most 8 pages are scraped at the same time
+        self.scraper = WebScraper(max_concurrent_scrapes=8)
         self.checker = RelevanceChecker(self.llm)
-        self.formatter = JSONFormatter()
+        # Number of pages classified per relevance LLM call
+        self.relevance_batch_size = 10
+
+    async def setup(self):
+        """Start long-lived resources shared across the run"""
+        await self.scraper.start()
+        await self.checker.load_encoding()
+
+    async def aclose(self):
+        """Release long-lived resources"""
+        await self.scraper.aclose()
+        print(f"LLM cache: {self.llm.cache.hits} hits, {self.llm.cache.misses} misses")
+        self.llm.cache.close()
+        self.search.close()
+
+    async def run(self, query, output_path):
+        """Research the query, streaming relevant resources to output_path; returns how many were found"""
+        await self.setup()
+        try:
+            with JSONStreamWriter(output_path) as writer:
+                await self._run(query, writer)
+            return writer.count
+        finally:
+            await self.aclose()
+
+    async def _check_batch(self, query, batch, writer):
+        """Write the resources of a batch of scraped pages that are relevant to the query"""
+        items = [(str(i), content["content"]) for i, (_, content) in enumerate(batch, 1)]
+        # One failed LLM call (e.g. a 429) must not abort the run or orphan other batches
+        try:
+            verdicts = await self.checker.is_relevant_batch(query, items)
+        except Exception as e:
+            logger.error(f"Error checking relevance of {len(batch)} pages: {e}")
+            return
+        for (doc_id, _), (result, content) in zip(items, batch):
+            if verdicts.get(doc_id):
+                writer.write({"title": content["title"], "url": result})
 
-    async def run(self, query):
+    async def _run(self, query, writer):
         keywords = await self.extractor.extract(query)
-        results = self.search.search(keywords)
 
-        relevant_resources = []
-        for result in results:
-            content = await self.scraper.scrape_website(result["href"])
+        prefilter = KeywordPrefilter(keywords)
+        batch = []
+        checks = []
+
+        async def process(result):
+            nonlocal batch
+            # One failed scrape must not cancel the rest of the run
+            try:
+                content = await self.scraper.scrape_website(result["href"])
+            except Exception as e:
+                logger.error(f"Error scraping {result['href']}: {e}")
+                return
             if not content["content"]:
-                continue
-            if self.checker.is_relevant(query, content["content"]):
-                summary = content["title"]
-                relevant_resources.append({
-                    "title": summary,
-                    "url": result
-                })
-
-        return self.formatter.format(relevant_resources)
+                return
+            # Clear keyword hits and misses are decided locally; only ambiguous pages reach the LLM
+            verdict = prefilter.verdict(content["content"])
+            if verdict is True:
+                writer.write({"title": content["title"], "url": result})
+                return
+            if verdict is False:
+                return
+            # Relevance batches are dispatched as soon as enough pages have been scraped
+            batch.append((result, content))
+            if len(batch) >= self.relevance_batch_size:
+                checks.append(asyncio.create_task(self._check_batch(query, batch, writer)))
+                batch = []
+
+        # Scraping starts on each result while the remaining queries are still being searched
+        scrapes = [
+            asyncio.create_task(process(result))
+            async for result in self.search.search_stream(keywords)
+        ]
+        await asyncio.gather(*scrapes)
+        if batch:
+            checks.append(asyncio.create_task(self._check_batch(query, batch, writer)))
+
+        await asyncio.gather(*checks, return_exceptions=True)
     
 async def main():
     agent = ResearchAgent()
     query = input("Ask your research question: ")
     
-    result = await agent.run(query)
-    
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
     filename = f"research_output_{timestamp}.json" 
     
-    with open(filename, "w", encoding="utf-8") as f:
-        f.write(result)
+    count = await agent.run(query, filename)
 
-    print(f"\nResearch completed. Results saved to: {filename}")
+    print(f"\nResearch completed. {count} results saved to: {filename}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file